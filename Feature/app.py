@@ -1,4 +1,5 @@
 import os
+import sys
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -6,9 +7,39 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from openai import OpenAI
 import io
+import hashlib
+import threading
+import time
+import uuid
 import warnings
+from collections import OrderedDict
+from profiling import profile_columns
 warnings.filterwarnings('ignore')
 
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.0
+    guess_datetime_format = None
+
+# Tables at least this wide are profiled column-parallel across a process pool
+PARALLEL_PROFILE_MIN_COLUMNS = 200
+
+# Resampling frequencies offered in time-series mode, with their approximate bucket width
+TIME_SERIES_FREQUENCIES = {
+    's': pd.Timedelta(seconds=1),
+    'min': pd.Timedelta(minutes=1),
+    'h': pd.Timedelta(hours=1),
+    'D': pd.Timedelta(days=1),
+    'W': pd.Timedelta(weeks=1),
+    'MS': pd.Timedelta(days=30),
+}
+
+# Maximum points drawn per time-series line chart (LTTB-downsampled beyond this)
+TIME_SERIES_CHART_POINTS = 2000
+
+# Rows sampled to preview the feature engineering pipeline
+PIPELINE_PREVIEW_ROWS = 1000
+
 # Set page config
 st.set_page_config(
     page_title="CSV Data Analyzer", 
@@ -212,26 +243,137 @@ def generate_feature_engineering_suggestions(df):
     except Exception as e:
         return f"Error generating feature engineering suggestions: {str(e)}"
 
-def detect_feature_opportunities(df):
+# Bit counts for every byte value, used when np.bitwise_count (numpy >= 2.0) is unavailable
+_POPCOUNT_TABLE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+def _popcount_rows(words):
+    """Number of set bits along the last axis of a uint64 array"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    return _POPCOUNT_TABLE[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+def analyze_missing_patterns(df, top_n=10, row_chunk=1 << 16):
+    """Which columns go missing together, from bit-packed per-column null masks.
+
+    Each column's null mask is packed into a bitset (8 rows per byte); pairwise
+    co-missing counts are popcounts of bitwise ANDs, and row-level patterns are
+    read back from the same bitsets in chunks.
+    """
+    missing_counts = df.isnull().sum()
+    missing_cols = missing_counts[missing_counts > 0].index.tolist()
+    n_rows, k = len(df), len(missing_cols)
+    if k == 0:
+        return None
+
+    # Column bitsets, padded to whole uint64 words
+    n_bytes = -(-n_rows // 64) * 8
+    bitsets = np.zeros((k, n_bytes), dtype=np.uint8)
+    for i, col in enumerate(missing_cols):
+        packed = np.packbits(df[col].isnull().to_numpy())
+        bitsets[i, :len(packed)] = packed
+    words = bitsets.view(np.uint64)
+
+    # Pairwise co-missing counts, in row blocks to bound the temporary AND array
+    co_missing = np.empty((k, k), dtype=np.int64)
+    block = max(1, (1 << 22) // max(1, k * words.shape[1]))
+    for start in range(0, k, block):
+        stop = min(start + block, k)
+        co_missing[start:stop] = _popcount_rows(words[start:stop, None, :] & words[None, :, :])
+
+    counts = np.diag(co_missing)
+    union = counts[:, None] + counts[None, :] - co_missing
+    with np.errstate(invalid='ignore', divide='ignore'):
+        jaccard = np.where(union > 0, co_missing / union, 0.0)
+    upper_i, upper_j = np.triu_indices(k, k=1)
+    pairs = pd.DataFrame({
+        'Column A': np.array(missing_cols, dtype=object)[upper_i],
+        'Column B': np.array(missing_cols, dtype=object)[upper_j],
+        'Co-missing Rows': co_missing[upper_i, upper_j],
+        'Jaccard': jaccard[upper_i, upper_j].round(3),
+    })
+    pairs = pairs[pairs['Co-missing Rows'] > 0].sort_values(['Jaccard', 'Co-missing Rows'], ascending=False)
+
+    # Row-level patterns: transpose bitset chunks into one packed key per row
+    pattern_counts = {}
+    chunk_bytes = row_chunk // 8
+    for start in range(0, -(-n_rows // 8), chunk_bytes):
+        row_masks = np.unpackbits(bitsets[:, start:start + chunk_bytes], axis=1)
+        row_masks = row_masks[:, :max(0, min(row_chunk, n_rows - start * 8))].T
+        keys, key_counts = np.unique(np.packbits(row_masks, axis=1), axis=0, return_counts=True)
+        for key, count in zip(keys, key_counts):
+            pattern_counts[key.tobytes()] = pattern_counts.get(key.tobytes(), 0) + int(count)
+
+    complete_key = bytes(-(-k // 8))
+    complete_rows = pattern_counts.pop(complete_key, 0)
+    patterns = sorted(pattern_counts.items(), key=lambda item: item[1], reverse=True)[:top_n]
+    pattern_rows = []
+    for key, count in patterns:
+        flags = np.unpackbits(np.frombuffer(key, dtype=np.uint8))[:k].astype(bool)
+        pattern_cols = [col for col, flag in zip(missing_cols, flags) if flag]
+        pattern_rows.append({
+            'Missing Columns': ', '.join(map(str, pattern_cols)),
+            'Columns': len(pattern_cols),
+            'Rows': count,
+            '% of Rows': round(count / n_rows * 100, 2),
+        })
+
+    incomplete_rows = n_rows - complete_rows
+    # Structured missingness: some columns are (almost) always missing together
+    structured = bool((pairs['Jaccard'] >= 0.8).any())
+    return {
+        'columns': missing_cols,
+        'co_missing': pd.DataFrame(co_missing, index=missing_cols, columns=missing_cols),
+        'pairs': pairs,
+        'patterns': pd.DataFrame(pattern_rows),
+        'n_patterns': len(pattern_counts),
+        'complete_rows': complete_rows,
+        'incomplete_rows': incomplete_rows,
+        'structured': structured,
+    }
+
+def detect_feature_opportunities(df, column_profile=None, missing_patterns=None):
     """Detect specific feature engineering opportunities in the dataset"""
     opportunities = []
     
     numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
     categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
     
+    # Per-column statistics, precomputed in parallel for wide tables
+    if column_profile:
+        skew_of = column_profile['skew'].get
+        nunique_of = column_profile['nunique'].get
+    else:
+        skew_of = lambda col: df[col].skew()
+        nunique_of = lambda col: df[col].nunique()
+        
     # 1. Missing value opportunities
     missing_cols = df.isnull().sum()
     missing_cols = missing_cols[missing_cols > 0]
     if not missing_cols.empty:
+        if missing_patterns is None:
+            missing_patterns = analyze_missing_patterns(df)
+        incomplete_share = missing_patterns['incomplete_rows'] / len(df)
+        # Columns that go missing together point at a systematic cause (joins, optional sections)
+        if (missing_cols > len(df) * 0.1).any() or (missing_patterns['structured'] and incomplete_share >= 0.01):
+            severity = 'High'
+        elif incomplete_share < 0.01 and not missing_patterns['structured']:
+            severity = 'Low'
+        else:
+            severity = 'Medium'
+        
+        description = f"Handle missing values in {len(missing_cols)} columns ({missing_patterns['n_patterns']} distinct missing patterns"
+        if missing_patterns['structured']:
+            description += ", some columns go missing together"
         opportunities.append({
             'type': 'Missing Values',
-            'description': f"Handle missing values in {len(missing_cols)} columns",
+            'description': description + ")",
             'columns': list(missing_cols.index),
-            'severity': 'High' if (missing_cols > len(df) * 0.1).any() else 'Medium'
+            'severity': severity,
+            'co_missing_pairs': missing_patterns['pairs'][missing_patterns['pairs']['Jaccard'] >= 0.8].head(10)
         })
     
     # 2. High cardinality categorical features
-    high_card_cols = [col for col in categorical_cols if df[col].nunique() > 50 and df[col].nunique() < len(df) * 0.9]
+    high_card_cols = [col for col in categorical_cols if 50 < nunique_of(col) < len(df) * 0.9]
     if high_card_cols:
         opportunities.append({
             'type': 'High Cardinality Encoding',
@@ -243,8 +385,9 @@ def detect_feature_opportunities(df):
     # 3. Skewed numeric features
     skewed_cols = []
     for col in numeric_cols:
-        skewness = df[col].skew()
-        if abs(skewness) > 2:
+        skewness = skew_of(col)
+        # No skewness for a header-only table (NaN from pandas, missing from the profile)
+        if skewness is not None and abs(skewness) > 2:
             skewed_cols.append(col)
     
     if skewed_cols:
@@ -271,7 +414,7 @@ def detect_feature_opportunities(df):
         })
     
     # 5. Binary encoding opportunities
-    binary_cols = [col for col in categorical_cols if df[col].nunique() == 2]
+    binary_cols = [col for col in categorical_cols if nunique_of(col) == 2]
     if binary_cols:
         opportunities.append({
             'type': 'Binary Encoding',
@@ -291,7 +434,142 @@ def detect_feature_opportunities(df):
     
     return opportunities
 
-def analyze_data(df):
+def _fit_missing_values(df, columns):
+    """Missing indicator plus median (numeric) / mode (categorical) imputation"""
+    fills = {}
+    for col in columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            fills[col] = df[col].median()
+        else:
+            mode = df[col].mode()
+            fills[col] = mode.iloc[0] if not mode.empty else ''
+
+    def apply(chunk):
+        out = {}
+        for col, fill in fills.items():
+            out[f'{col}_missing'] = chunk[col].isnull().astype(np.int8)
+            out[col] = chunk[col].fillna(fill)
+        return out
+    return apply
+
+def _fit_frequency_encoding(df, columns):
+    """Frequency encoding (no target column is known, so target encoding isn't possible here)"""
+    frequencies = {col: df[col].value_counts(normalize=True) for col in columns}
+
+    def apply(chunk):
+        return {f'{col}_freq': chunk[col].map(freq).astype(np.float64) for col, freq in frequencies.items()}
+    return apply
+
+def _fit_log_transform(df, columns):
+    """Signed log1p so negative skewed values are handled too"""
+    def apply(chunk):
+        return {f'{col}_log': np.sign(chunk[col]) * np.log1p(np.abs(chunk[col])) for col in columns}
+    return apply
+
+def _fit_date_parts(df, columns):
+    """Year/month/weekday/quarter, parsing with a format guessed once from the full column"""
+    formats = {}
+    for col in columns:
+        sample = df[col].dropna()
+        formats[col] = guess_datetime_format(str(sample.iloc[0])) if len(sample) and guess_datetime_format else None
+
+    def apply(chunk):
+        out = {}
+        for col, fmt in formats.items():
+            dates = pd.to_datetime(chunk[col], format=fmt, errors='coerce')
+            out[f'{col}_year'] = dates.dt.year
+            out[f'{col}_month'] = dates.dt.month
+            out[f'{col}_day_of_week'] = dates.dt.dayofweek
+            out[f'{col}_quarter'] = dates.dt.quarter
+        return out
+    return apply
+
+def _fit_binary_encoding(df, columns):
+    """Map the two observed values of each column to 0/1 (sorted, like LabelEncoder)"""
+    mappings = {}
+    for col in columns:
+        values = sorted(df[col].dropna().unique(), key=str)
+        mappings[col] = {value: code for code, value in enumerate(values)}
+
+    def apply(chunk):
+        return {f'{col}_encoded': chunk[col].map(mapping) for col, mapping in mappings.items()}
+    return apply
+
+def _fit_interactions(df, columns):
+    """Pairwise products and ratios of the example numeric columns"""
+    pairs = [(a, b) for i, a in enumerate(columns) for b in columns[i + 1:]]
+
+    def apply(chunk):
+        out = {}
+        for a, b in pairs:
+            out[f'{a}_x_{b}'] = chunk[a] * chunk[b]
+            out[f'{a}_div_{b}'] = chunk[a] / (chunk[b] + 1e-8)
+        return out
+    return apply
+
+# Opportunity type -> fit function returning a vectorized chunk transform
+FEATURE_TRANSFORMS = {
+    'Missing Values': _fit_missing_values,
+    'High Cardinality Encoding': _fit_frequency_encoding,
+    'Skewness Transformation': _fit_log_transform,
+    'Date Feature Extraction': _fit_date_parts,
+    'Binary Encoding': _fit_binary_encoding,
+    'Feature Interactions': _fit_interactions,
+}
+
+def compile_feature_pipeline(df, opportunities, selected_types):
+    """Fit the selected opportunity transforms on the full dataset once.
+
+    Each step's parameters (fill values, category maps, date formats) are
+    computed up front, so applying a step to any chunk is a pure vectorized
+    operation and every chunk is transformed identically.
+    """
+    pipeline = []
+    for opp in opportunities:
+        if opp['type'] in selected_types and opp['type'] in FEATURE_TRANSFORMS:
+            pipeline.append({
+                'name': opp['type'],
+                'columns': opp['columns'],
+                'apply': FEATURE_TRANSFORMS[opp['type']](df, opp['columns']),
+            })
+    return pipeline
+
+def run_feature_pipeline(df, pipeline, chunk_size=250_000, progress=None):
+    """Apply a compiled pipeline chunk by chunk, returning the engineered frame and per-step throughput"""
+    n_rows = len(df)
+    seconds = [0.0] * len(pipeline)
+    written = [set() for _ in pipeline]
+    pieces = []
+
+    for start in range(0, max(n_rows, 1), chunk_size):
+        # Copy the chunk so the shared source DataFrame is never modified
+        chunk = df.iloc[start:start + chunk_size].copy()
+        for i, step in enumerate(pipeline):
+            began = time.perf_counter()
+            new_columns = step['apply'](chunk)
+            for name, values in new_columns.items():
+                chunk[name] = values
+            seconds[i] += time.perf_counter() - began
+            written[i].update(new_columns)
+        pieces.append(chunk)
+        if progress:
+            progress(min(start + chunk_size, n_rows) / max(n_rows, 1))
+
+    step_stats = pd.DataFrame({
+        'Step': [step['name'] for step in pipeline],
+        'Columns Written': [len(cols) for cols in written],
+        'Seconds': np.round(seconds, 4),
+        'Rows/s': [f"{n_rows / s:,.0f}" if s > 0 else "-" for s in seconds],
+    })
+    return pd.concat(pieces), step_stats
+
+def to_parquet_bytes(df):
+    """Serialize a DataFrame to Parquet in memory (requires pyarrow or fastparquet)"""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+def analyze_data(df, column_profile=None):
     """Perform comprehensive data analysis"""
     analysis = {}
     
@@ -315,10 +593,143 @@ def analyze_data(df):
     if categorical_cols:
         analysis['categorical_stats'] = {}
         for col in categorical_cols:
-            analysis['categorical_stats'][col] = df[col].value_counts().head(10)
+            if column_profile:
+                analysis['categorical_stats'][col] = column_profile['value_counts'][col]
+            else:
+                analysis['categorical_stats'][col] = df[col].value_counts().head(10)
     
     return analysis
 
+def find_time_columns(df):
+    """List datetime columns plus object columns whose values look like dates"""
+    candidates = df.select_dtypes(include=['datetime', 'datetimetz']).columns.tolist()
+    for col in df.select_dtypes(include=['object']).columns:
+        sample_vals = df[col].dropna().head(10).astype(str).tolist()
+        if any(len(val) >= 8 and ('-' in val or '/' in val) for val in sample_vals):
+            candidates.append(col)
+    return candidates
+
+def _auto_frequency(span, target_bins=10000):
+    """Pick the finest standard resampling frequency giving at most ~target_bins buckets"""
+    for freq, step in TIME_SERIES_FREQUENCIES.items():
+        if span / step <= target_bins:
+            return freq
+    return 'MS'
+
+def _autocorrelation(values, max_lag):
+    """Autocorrelation for lags 0..max_lag via FFT (O(n log n) instead of O(n * lags))"""
+    x = values - values.mean()
+    n = len(x)
+    spectrum = np.fft.rfft(x, n=2 * n)  # zero-pad to avoid circular wrap-around
+    acf = np.fft.irfft(spectrum * np.conj(spectrum))[:max_lag + 1]
+    return acf / acf[0] if acf[0] > 0 else np.zeros_like(acf)
+
+def lttb_downsample(x, y, n_out):
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices of the points to keep"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Average point of every bucket, with the final point acting as the bucket after the last one
+    counts = np.diff(np.append(edges, n))
+    avg_x = np.add.reduceat(x, np.append(edges[:-1], n - 1)) / counts
+    avg_y = np.add.reduceat(y, np.append(edges[:-1], n - 1)) / counts
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        bx, by = x[start:stop], y[start:stop]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+def time_series_order(df, time_col):
+    """Positions of df's rows sorted by time_col (unparseable timestamps dropped) and their times.
+
+    This is the expensive part of a time-series profile and depends only on time_col,
+    so it is what gets cached; it holds two arrays rather than a copy of the data.
+    """
+    ts = pd.to_datetime(df[time_col], errors='coerce')
+    valid = np.flatnonzero(ts.notna().to_numpy())
+    rows = valid[np.argsort(ts.to_numpy()[valid], kind='stable')]
+    return {'rows': rows, 'times': ts.to_numpy()[rows], 'n_unparsed': len(df) - len(valid)}
+
+def time_series_column(df, order, column):
+    """One column of df in time order, indexed by timestamp"""
+    return pd.DataFrame({column: df[column].to_numpy()[order['rows']]}, index=pd.DatetimeIndex(order['times']))
+
+def analyze_time_series(df, order, value_col=None, freq=None, window=7, gap_factor=10, max_lag=1000):
+    """Time-series profile of df in the row order from time_series_order: resampled aggregates,
+    gaps, seasonality/autocorrelation and rolling statistics of value_col"""
+    times = order['times']
+    result = {
+        'times': times,
+        'n_points': len(times),
+        'n_unparsed': order['n_unparsed'],
+    }
+    if len(times) < 2:
+        return result
+
+    span = pd.Timedelta(times[-1] - times[0])
+    freq = freq or _auto_frequency(span)
+    result['start'], result['end'], result['frequency'] = times[0], times[-1], freq
+
+    # Resampled aggregates (event count + mean of the series column)
+    target = value_col if value_col in df.columns else 'events'
+    frame = time_series_column(df, order, target) if target != 'events' else pd.DataFrame(index=pd.DatetimeIndex(times))
+    resampled = frame.resample(freq).mean()
+    resampled.insert(0, 'events', frame.resample(freq).size())
+    result['resampled'] = resampled
+
+    # Gap detection on the raw inter-arrival times
+    deltas = np.diff(times.astype('datetime64[ns]').astype(np.int64))
+    positive = deltas[deltas > 0]
+    typical = np.median(positive) if len(positive) else 0
+    gap_idx = np.flatnonzero(deltas > typical * gap_factor) if typical else np.array([], dtype=np.int64)
+    gaps = pd.DataFrame({
+        'Gap Start': times[gap_idx],
+        'Gap End': times[gap_idx + 1],
+        'Duration': pd.to_timedelta(deltas[gap_idx], unit='ns'),
+    }).sort_values('Duration', ascending=False)
+    result['typical_interval'] = pd.Timedelta(int(typical), unit='ns')
+    result['gaps'] = gaps
+
+    # Seasonality: strongest local maximum of the autocorrelation of the resampled series
+    series = resampled[target].interpolate(limit_direction='both').to_numpy(dtype=np.float64)
+    lags = min(max_lag, len(series) - 1)
+    if lags >= 3 and np.isfinite(series).all():
+        acf = _autocorrelation(series, lags)
+        peaks = np.flatnonzero((acf[1:-1] > acf[:-2]) & (acf[1:-1] >= acf[2:])) + 1
+        result['acf'] = acf
+        result['acf_column'] = target
+        if len(peaks):
+            best = peaks[np.argmax(acf[peaks])]
+            result['season_lag'] = int(best)
+            result['season_strength'] = float(acf[best])
+
+    # Rolling statistics over the resampled series
+    rolling = resampled[target].rolling(window, min_periods=1)
+    result['rolling'] = pd.DataFrame({
+        target: resampled[target],
+        f'rolling mean ({window})': rolling.mean(),
+        f'rolling std ({window})': rolling.std(),
+    })
+    return result
+
+def downsample_for_chart(data, column, n_out=TIME_SERIES_CHART_POINTS):
+    """LTTB-downsample a time-indexed frame on one column so line charts stay responsive"""
+    data = data[data[column].notna()]
+    if len(data) <= n_out:
+        return data
+    x = data.index.to_numpy().astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    keep = lttb_downsample(x, data[column].to_numpy(dtype=np.float64), n_out)
+    return data.iloc[keep]
+
 def create_visualizations(df, analysis):
     """Create various visualizations"""
     numeric_cols = analysis['numeric_columns']
@@ -413,6 +824,123 @@ def create_visualizations(df, analysis):
     
     return visualizations
 
+def object_nbytes(value):
+    """Approximate memory held by a cached profile (frames, arrays and containers of them)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(object_nbytes(item) for item in value.values()) + sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set)):
+        return sum(object_nbytes(item) for item in value) + sys.getsizeof(value)
+    return sys.getsizeof(value)
+
+class DatasetRegistry:
+    """Process-wide store of parsed datasets and their profiles, shared by all sessions.
+
+    Entries are keyed by a hash of the uploaded file's content and track which
+    sessions currently hold them. Entries no session holds are evicted in
+    least-recently-used order once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes, session_ttl=3600):
+        self.max_bytes = max_bytes
+        # Sessions that close their tab never release; treat them as gone after this many seconds
+        self.session_ttl = session_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def acquire(self, key, session_id, loader):
+        """Return the dataset for key, parsing it with loader() only if no session has it loaded"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {'lock': threading.Lock(), 'df': None, 'nbytes': 0, 'sessions': {}, 'profiles': {}, 'profile_bytes': 0}
+                self._entries[key] = entry
+            entry['sessions'][session_id] = time.monotonic()
+            self._entries.move_to_end(key)
+
+        # Per-entry lock: concurrent uploads of the same file parse it once
+        with entry['lock']:
+            if entry['df'] is None:
+                try:
+                    df = loader()
+                except Exception:
+                    with self._lock:
+                        self._entries.pop(key, None)
+                    raise
+                with self._lock:
+                    entry['df'] = df
+                    entry['nbytes'] = int(df.memory_usage(deep=True).sum())
+                    self._evict()
+        return entry['df']
+
+    def release(self, key, session_id):
+        """Drop session_id's reference to key, making the entry evictable once unreferenced"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['sessions'].pop(session_id, None)
+                self._evict()
+
+    def profile(self, key, name, compute):
+        """Return the cached profile `name` of dataset key, computing it once across all sessions.
+
+        Profiles count towards the entry's size; if the entry has been evicted the
+        profile is just computed.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return compute()
+        with entry['lock']:
+            if name not in entry['profiles']:
+                value = compute()
+                entry['profiles'][name] = value
+                with self._lock:
+                    entry['profile_bytes'] += object_nbytes(value)
+                    self._evict()
+            return entry['profiles'][name]
+
+    def stats(self):
+        """Summary of the registry for display"""
+        with self._lock:
+            return {
+                'datasets': len(self._entries),
+                'bytes': sum(entry['nbytes'] + entry['profile_bytes'] for entry in self._entries.values()),
+                'sessions': len({sid for entry in self._entries.values() for sid in entry['sessions']}),
+            }
+
+    def sessions_for(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return len(entry['sessions']) if entry else 0
+
+    def _evict(self):
+        """Evict unreferenced entries, least recently used first, until under max_bytes (caller holds the lock)"""
+        now = time.monotonic()
+        for entry in self._entries.values():
+            for sid, seen in list(entry['sessions'].items()):
+                if now - seen > self.session_ttl:
+                    del entry['sessions'][sid]
+
+        total = sum(entry['nbytes'] + entry['profile_bytes'] for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if not entry['sessions'] and entry['df'] is not None:
+                total -= entry['nbytes'] + entry['profile_bytes']
+                del self._entries[key]
+
+@st.cache_resource
+def get_dataset_registry():
+    """The single DatasetRegistry shared by every session in this process"""
+    return DatasetRegistry(max_bytes=int(os.environ.get("DATASET_REGISTRY_MAX_MB", 2048)) * 1024**2)
+
 def main():
     # Title
     st.markdown('<h1 class="main-header">📊 CSV Data Analyzer with AI Insights</h1>', unsafe_allow_html=True)
@@ -421,6 +949,19 @@ def main():
     # Setup OpenAI client
     client = setup_openai_client()
     
+    # Datasets and profiles are shared across sessions through the process-wide registry
+    registry = get_dataset_registry()
+    session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex)
+    registry_stats = registry.stats()
+    st.sidebar.caption(f"📦 {registry_stats['datasets']} shared dataset(s) in memory ({registry_stats['bytes'] / 1024**2:.0f} MB)")
+    
+    # Profiling options
+    parallel_profiling = st.sidebar.checkbox(
+        "⚡ Parallel column profiling",
+        value=True,
+        help=f"Profile columns across all CPU cores for tables with {PARALLEL_PROFILE_MIN_COLUMNS}+ columns"
+    )
+    
     # File upload
     uploaded_file = st.file_uploader(
         "Choose a CSV file", 
@@ -432,7 +973,18 @@ def main():
         try:
             # Load data
             with st.spinner("Loading and processing your data..."):
-                df = pd.read_csv(uploaded_file)
+                raw_bytes = uploaded_file.getvalue()
+                dataset_key = hashlib.blake2b(raw_bytes, digest_size=16).hexdigest()
+                previous_key = st.session_state.get('dataset_key')
+                if previous_key and previous_key != dataset_key:
+                    registry.release(previous_key, session_id)
+                st.session_state.dataset_key = dataset_key
+                df = registry.acquire(dataset_key, session_id, lambda: pd.read_csv(io.BytesIO(raw_bytes)))
+            
+            memory_mb = registry.profile(dataset_key, 'memory_mb', lambda: df.memory_usage(deep=True).sum() / 1024**2)
+            shared_with = registry.sessions_for(dataset_key) - 1
+            if shared_with > 0:
+                st.caption(f"📦 Shared with {shared_with} other active session(s) - data and profiles are reused")
             
             st.success(f"✅ Successfully loaded data with {df.shape[0]} rows and {df.shape[1]} columns!")
             
@@ -449,11 +1001,14 @@ def main():
             with col3:
                 st.metric("Missing Values", df.isnull().sum().sum())
             with col4:
-                st.metric("Memory Usage", f"{df.memory_usage(deep=True).sum() / 1024**2:.2f} MB")
+                st.metric("Memory Usage", f"{memory_mb:.2f} MB")
             
             # Perform analysis
             with st.spinner("Analyzing your data..."):
-                analysis = analyze_data(df)
+                column_profile = None
+                if parallel_profiling and df.shape[1] >= PARALLEL_PROFILE_MIN_COLUMNS:
+                    column_profile = registry.profile(dataset_key, 'column_profile', lambda: profile_columns(df))
+                analysis = registry.profile(dataset_key, 'analysis', lambda: analyze_data(df, column_profile))
             
             # Detailed Summary
             st.markdown('<div class="section-header">📊 Detailed Summary</div>', unsafe_allow_html=True)
@@ -483,6 +1038,26 @@ def main():
                 else:
                     st.success("No missing values found! 🎉")
             
+            # Missingness patterns
+            missing_patterns = registry.profile(dataset_key, 'missing_patterns', lambda: analyze_missing_patterns(df))
+            if missing_patterns:
+                st.subheader("Missingness Patterns")
+                st.caption(
+                    f"{missing_patterns['incomplete_rows']:,} incomplete rows across "
+                    f"{missing_patterns['n_patterns']:,} distinct missing patterns; "
+                    f"{missing_patterns['complete_rows']:,} rows are complete."
+                )
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown("**Most frequent row patterns**")
+                    st.dataframe(missing_patterns['patterns'], use_container_width=True, hide_index=True)
+                with col2:
+                    st.markdown("**Columns missing together**")
+                    if missing_patterns['pairs'].empty:
+                        st.info("No two columns are ever missing in the same row.")
+                    else:
+                        st.dataframe(missing_patterns['pairs'].head(10), use_container_width=True, hide_index=True)
+            
             # Numeric statistics
             if analysis['numeric_columns']:
                 st.subheader("Numeric Columns Statistics")
@@ -511,6 +1086,65 @@ def main():
                 st.pyplot(fig)
                 plt.close(fig)  # Clean up memory
             
+            # Time-Series Analysis
+            time_cols = find_time_columns(df)
+            if time_cols:
+                st.markdown('<div class="section-header">⏱️ Time-Series Analysis</div>', unsafe_allow_html=True)
+                
+                numeric_options = analysis['numeric_columns'] or ['events']
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    time_col = st.selectbox("Timestamp column", ["None"] + time_cols, help="Profile the data as a time series ordered by this column")
+                with col2:
+                    value_col = st.selectbox("Series", numeric_options)
+                with col3:
+                    freq_choice = st.selectbox("Resample frequency", ["Auto"] + list(TIME_SERIES_FREQUENCIES.keys()))
+                with col4:
+                    window = st.slider("Rolling window (buckets)", 2, 60, 7)
+                
+                if time_col != "None":
+                    with st.spinner("Profiling time series..."):
+                        order = registry.profile(dataset_key, ('time_series_order', time_col), lambda: time_series_order(df, time_col))
+                        ts = analyze_time_series(df, order, value_col, None if freq_choice == "Auto" else freq_choice, window)
+                    
+                    if ts['n_points'] < 2:
+                        st.warning(f"Not enough parseable timestamps in '{time_col}' for time-series analysis.")
+                    else:
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("Time Span", str(pd.Timedelta(ts['end'] - ts['start'])))
+                        with col2:
+                            st.metric("Typical Interval", str(ts['typical_interval']))
+                        with col3:
+                            st.metric("Gaps Detected", len(ts['gaps']))
+                        with col4:
+                            if 'season_lag' in ts:
+                                st.metric("Seasonality", f"{ts['season_lag']} × {ts['frequency']}", f"ACF {ts['season_strength']:.2f}")
+                            else:
+                                st.metric("Seasonality", "None detected")
+                        if ts['n_unparsed']:
+                            st.caption(f"{ts['n_unparsed']:,} rows with unparseable timestamps were excluded.")
+                        
+                        if value_col in df.columns:
+                            st.subheader(f"{value_col} over time")
+                            raw = downsample_for_chart(time_series_column(df, order, value_col), value_col)
+                            st.line_chart(raw)
+                            st.caption(f"Showing {len(raw):,} of {ts['n_points']:,} points (LTTB downsampled)")
+                        
+                        st.subheader(f"Resampled Aggregates ({ts['frequency']})")
+                        st.line_chart(downsample_for_chart(ts['resampled'][['events']], 'events'))
+                        
+                        st.subheader("Rolling Statistics")
+                        st.line_chart(downsample_for_chart(ts['rolling'], ts['rolling'].columns[0]))
+                        
+                        if 'acf' in ts:
+                            st.subheader(f"Autocorrelation of {ts['acf_column']} (lags in {ts['frequency']} buckets)")
+                            st.line_chart(pd.DataFrame({'ACF': ts['acf']}))
+                        
+                        if not ts['gaps'].empty:
+                            st.subheader("Largest Gaps")
+                            st.dataframe(ts['gaps'].head(20), use_container_width=True, hide_index=True)
+            
             # AI Summary
             st.markdown('<div class="section-header">🤖 AI-Generated Insights</div>', unsafe_allow_html=True)
             
@@ -536,7 +1170,7 @@ def main():
             st.markdown('<div class="section-header">🛠️ Feature Engineering Suggestions</div>', unsafe_allow_html=True)
             
             # Automatic feature opportunities detection
-            opportunities = detect_feature_opportunities(df)
+            opportunities = registry.profile(dataset_key, 'opportunities', lambda: detect_feature_opportunities(df, column_profile, missing_patterns))
             
             if opportunities:
                 st.subheader("🎯 Detected Opportunities")
@@ -554,6 +1188,9 @@ def main():
                         
                         # Show specific recommendations based on type
                         if opp['type'] == 'Missing Values':
+                            if not opp['co_missing_pairs'].empty:
+                                st.write("**Columns missing together** (consider a shared missing indicator):")
+                                st.dataframe(opp['co_missing_pairs'], use_container_width=True, hide_index=True)
                             st.code("""
 # Handle missing values
 df['column_name_missing'] = df['column_name'].isnull().astype(int)  # Missing indicator
@@ -598,6 +1235,55 @@ df['feature1_div_feature2'] = df['feature1'] / (df['feature2'] + 1e-8)
 df['feature1_plus_feature2'] = df['feature1'] + df['feature2']
                             """)
             
+            # Apply detected transforms directly
+            applicable = [opp['type'] for opp in opportunities if opp['type'] in FEATURE_TRANSFORMS]
+            if applicable:
+                st.subheader("⚙️ Apply Feature Engineering")
+                selected_types = st.multiselect(
+                    "Transforms to apply",
+                    applicable,
+                    default=[t for t in applicable if t != 'Feature Interactions'],
+                    help="Parameters are fitted on the full dataset; the preview runs on a sample"
+                )
+                
+                if selected_types:
+                    pipeline = registry.profile(
+                        dataset_key, ('feature_pipeline', tuple(selected_types)),
+                        lambda: compile_feature_pipeline(df, opportunities, selected_types)
+                    )
+                    preview_rows = registry.profile(
+                        dataset_key, 'preview_sample',
+                        lambda: df.sample(n=min(PIPELINE_PREVIEW_ROWS, len(df)), random_state=0)
+                    )
+                    preview, _ = run_feature_pipeline(preview_rows, pipeline)
+                    st.markdown(f"**Preview** ({len(preview_rows):,} sampled rows)")
+                    st.dataframe(preview.head(20), use_container_width=True)
+                    
+                    if st.button("🚀 Apply to Full Dataset"):
+                        progress_bar = st.progress(0)
+                        engineered, step_stats = run_feature_pipeline(df, pipeline, progress=progress_bar.progress)
+                        progress_bar.empty()
+                        
+                        st.success(f"✅ Engineered dataset: {engineered.shape[0]} rows × {engineered.shape[1]} columns")
+                        st.dataframe(step_stats, use_container_width=True, hide_index=True)
+                        
+                        base_name = uploaded_file.name.replace('.csv', '')
+                        try:
+                            st.download_button(
+                                label="📥 Download Engineered Dataset (Parquet)",
+                                data=to_parquet_bytes(engineered),
+                                file_name=f"{base_name}_engineered.parquet",
+                                mime="application/octet-stream"
+                            )
+                        except ImportError:
+                            st.warning("Parquet export needs `pyarrow`; offering CSV instead.")
+                            st.download_button(
+                                label="📥 Download Engineered Dataset (CSV)",
+                                data=engineered.to_csv(index=False),
+                                file_name=f"{base_name}_engineered.csv",
+                                mime="text/csv"
+                            )
+            
             # AI-Powered Feature Engineering Suggestions
             if st.button("🤖 Get AI-Powered Feature Engineering Suggestions", type="primary"):
                 if client:
@@ -634,7 +1320,7 @@ df['feature1_plus_feature2'] = df['feature1'] + df['feature2']
                 'Numeric Columns': len(analysis['numeric_columns']),
                 'Categorical Columns': len(analysis['categorical_columns']),
                 'Total Missing Values': df.isnull().sum().sum(),
-                'Memory Usage (MB)': round(df.memory_usage(deep=True).sum() / 1024**2, 2)
+                'Memory Usage (MB)': round(memory_mb, 2)
             }
             
             report_df = pd.DataFrame(list(report_data.items()), columns=['Metric', 'Value'])
@@ -656,6 +1342,10 @@ df['feature1_plus_feature2'] = df['feature1'] + df['feature2']
             st.info("Please make sure your file is a valid CSV format.")
     
     else:
+        # Release this session's hold on a previously uploaded dataset
+        if st.session_state.get('dataset_key'):
+            registry.release(st.session_state.pop('dataset_key'), session_id)
+        
         # Instructions when no file is uploaded
         st.info("👆 Please upload a CSV file to begin the analysis")
         
@@ -666,8 +1356,9 @@ df['feature1_plus_feature2'] = df['feature1'] + df['feature2']
         2. **📊 Detailed Analysis** - Provides comprehensive statistics for both numeric and categorical data
         3. **📈 Automatic Visualizations** - Creates correlation heatmaps, distribution plots, and bar charts
         4. **🤖 AI Insights** - Generates natural language summaries highlighting key patterns and insights
-        5. **🛠️ Feature Engineering** - Automatically detects opportunities and provides AI-powered suggestions
-        6. **💾 Export Results** - Download your analysis summary
+        5. **⏱️ Time-Series Analysis** - Resampling, gap detection, seasonality and rolling statistics for timestamped data
+        6. **🛠️ Feature Engineering** - Automatically detects opportunities and provides AI-powered suggestions
+        7. **💾 Export Results** - Download your analysis summary
         
         ### 🛠️ Feature Engineering Capabilities:
         - **Automatic Detection**: Identifies missing values, skewed features, high-cardinality columns, date-like columns
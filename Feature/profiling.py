@@ -0,0 +1,101 @@
+"""Column profiling for the Feature app, run across a process pool.
+
+The pool workers live here rather than in app.py: Streamlit runs app.py as
+__main__, which spawned worker processes (Windows, macOS) cannot import.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _nan_skew(block):
+    """Row-wise skewness of a 2D float block, matching pandas' Series.skew (NaN-skipping, bias-corrected)"""
+    valid = ~np.isnan(block)
+    n = valid.sum(axis=1).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, block, 0.0).sum(axis=1) / n
+        dev = np.where(valid, block - mean[:, None], 0.0)
+        dev2 = dev * dev
+        m2 = dev2.sum(axis=1) / n
+        m3 = (dev2 * dev).sum(axis=1) / n
+        skew = (m3 / m2 ** 1.5) * np.sqrt(n * (n - 1)) / (n - 2)
+    skew[m2 == 0] = 0.0
+    skew[n < 3] = np.nan
+    return skew
+
+def _skew_from_shared(shm_name, shape, start, stop, batch=64):
+    """Worker: skewness of columns [start, stop) of a shared-memory float64 block"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        result = np.concatenate([
+            _nan_skew(block[i:min(i + batch, stop)]) for i in range(start, stop, batch)
+        ])
+        del block  # release the buffer export before closing
+        return start, result
+    finally:
+        shm.close()
+
+def _categorical_profile(frame):
+    """Worker: cardinality and top values for each column of a categorical shard"""
+    return {col: (frame[col].nunique(), frame[col].value_counts().head(10)) for col in frame.columns}
+
+def _column_shards(n_items, n_shards):
+    """Split range(n_items) into at most n_shards contiguous (start, stop) pairs"""
+    if n_items == 0:
+        return []
+    bounds = np.linspace(0, n_items, min(n_shards, n_items) + 1).astype(int)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def profile_columns(df, n_workers=None):
+    """Profile every column in parallel: skewness for numeric columns,
+    cardinality and top values for categorical columns.
+
+    Numeric columns are copied once into a shared-memory block that workers
+    attach to by name, so the DataFrame is never pickled. Object columns can't
+    live in shared memory, so each worker only receives its own shard of them.
+    """
+    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
+    n_workers = n_workers or os.cpu_count() or 1
+
+    profile = {'skew': {}, 'nunique': {}, 'value_counts': {}}
+    shm = None
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        try:
+            skew_futures = []
+            if numeric_cols and len(df):
+                shape = (len(numeric_cols), len(df))
+                shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+                block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+                for i, col in enumerate(numeric_cols):
+                    block[i] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                del block
+                skew_futures = [
+                    pool.submit(_skew_from_shared, shm.name, shape, start, stop)
+                    for start, stop in _column_shards(len(numeric_cols), n_workers)
+                ]
+
+            categorical_futures = [
+                pool.submit(_categorical_profile, df[categorical_cols[start:stop]])
+                for start, stop in _column_shards(len(categorical_cols), n_workers)
+            ]
+
+            # Merge shard results back into per-column lookups
+            for future in skew_futures:
+                start, values = future.result()
+                for offset, value in enumerate(values):
+                    profile['skew'][numeric_cols[start + offset]] = value
+            for future in categorical_futures:
+                for col, (nunique, value_counts) in future.result().items():
+                    profile['nunique'][col] = nunique
+                    profile['value_counts'][col] = value_counts
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    return profile
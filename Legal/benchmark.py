@@ -0,0 +1,282 @@
+"""Offline benchmark for LegalBriefGenerator.
+
+Runs every document type against a local stand-in for the OpenRouter
+chat-completions API, so latency and throughput can be measured without
+network access or API quota:
+
+    python benchmark.py --issues 8 --latency 0.3 --tokens-per-second 150 --error-rate 0.05
+
+Reports end-to-end time, time to first token and per-section time, the
+concurrency actually achieved at the server, and tokens processed.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubOpenRouter(ThreadingHTTPServer):
+    """Chat-completions endpoint answering with filler text at a configurable pace"""
+
+    daemon_threads = True
+
+    def __init__(self, latency: float, tokens_per_second: float, completion_tokens: int,
+                 error_rate: float, seed: int):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.tokens = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._busy = 0.0  # integral of in-flight requests over time
+        self._changed = time.perf_counter()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/api/v1"
+
+    def _track(self, change: int):
+        with self.lock:
+            now = time.perf_counter()
+            self._busy += self.in_flight * (now - self._changed)
+            self._changed = now
+            self.in_flight += change
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def snapshot(self) -> dict:
+        self._track(0)
+        with self.lock:
+            return {"requests": self.requests, "errors": self.errors, "prompt_tokens": self.prompt_tokens,
+                    "completion_tokens": self.tokens, "busy": self._busy}
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections at shutdown are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def reset_peak(self):
+        with self.lock:
+            self.peak_in_flight = self.in_flight
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        # Roughly four characters per token, as in the app's own facts budget
+        prompt_tokens = sum(len(message.get("content") or "") for message in request.get("messages", [])) // 4
+        with server.lock:
+            server.requests += 1
+            fail = server.random.random() < server.error_rate
+            server.errors += fail
+
+        server._track(1)
+        try:
+            time.sleep(server.latency)
+            if fail:
+                self._send_json(503, {"error": {"message": "stub overloaded", "code": 503}})
+                return
+
+            words = [f"token{i}" for i in range(server.completion_tokens)]
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                     "total_tokens": prompt_tokens + len(words)}
+            if request.get("stream"):
+                self._stream(request, words, usage)
+            else:
+                time.sleep(len(words) / server.tokens_per_second)
+                self._send_json(200, {
+                    "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": request["model"],
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+            with server.lock:
+                server.prompt_tokens += prompt_tokens
+                server.tokens += len(words)
+        finally:
+            server._track(-1)
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, request: dict, words: list, usage: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        chunk = lambda delta, finish=None, **extra: json.dumps({
+            "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": request["model"],
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}], **extra
+        })
+        for i, word in enumerate(words):
+            send(chunk({"content": word if i == 0 else f" {word}"}))
+            time.sleep(1 / self.server.tokens_per_second)
+        send(chunk({}, "stop", usage=usage))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def sample_case(app, issues: int, facts_paragraphs: int):
+    topics = ["breach of contract", "negligent misrepresentation", "unjust enrichment", "fraudulent inducement",
+              "breach of warranty", "tortious interference", "promissory estoppel", "conversion"]
+    legal_issues = [f"Whether the defendant is liable for {topics[i % len(topics)]} (issue {i + 1})" for i in range(issues)]
+    facts = "\n\n".join(
+        f"On day {i + 1} the parties exchanged correspondence about the delivery schedule, payment terms and "
+        f"the {topics[i % len(topics)]} claim. The plaintiff relied on the representations made at that time."
+        for i in range(facts_paragraphs)
+    )
+    return app.CaseDetails(
+        case_name="Benchmark Corp. v. Stub Industries",
+        court="United States District Court",
+        case_number="CV-0000-000001",
+        date="January 1, 2025",
+        parties={"plaintiff": "Benchmark Corp.", "defendant": "Stub Industries"},
+        facts=facts,
+        legal_issues=legal_issues,
+        jurisdiction="Federal",
+    )
+
+
+def run_document(app, generator, server: StubOpenRouter, document_type: str, case_details) -> dict:
+    """Generate one document with streaming on, timing each section from the start of the run"""
+    server.reset_peak()
+    before = server.snapshot()
+    first_tokens, sections, failed = {}, {}, 0
+    start = time.perf_counter()
+    for event in generator.stream_document(document_type, case_details, stream=True):
+        elapsed = time.perf_counter() - start
+        if event[0] == "token":
+            first_tokens.setdefault(event[1], elapsed)
+        elif event[0] == "section":
+            sections[event[1]] = elapsed
+            failed += bool(app.AI_FAILURE_RE.match(event[2]))
+    total = time.perf_counter() - start
+    after = server.snapshot()
+
+    return {
+        "document_type": document_type,
+        "seconds": total,
+        "sections": len(sections),
+        "failed_sections": failed,
+        "first_token_p50": percentile(list(first_tokens.values()), 0.5),
+        "section_p50": percentile(list(sections.values()), 0.5),
+        "section_p95": percentile(list(sections.values()), 0.95),
+        "requests": after["requests"] - before["requests"],
+        "errors": after["errors"] - before["errors"],
+        "prompt_tokens": after["prompt_tokens"] - before["prompt_tokens"],
+        "completion_tokens": after["completion_tokens"] - before["completion_tokens"],
+        "peak_concurrency": server.peak_in_flight,
+        "mean_concurrency": (after["busy"] - before["busy"]) / total if total else 0.0,
+    }
+
+
+def summarize(document_type: str, runs: list) -> dict:
+    """Median of each metric over the runs of one document type"""
+    summary = {"document_type": document_type, "runs": len(runs)}
+    for metric in runs[0]:
+        if metric != "document_type":
+            summary[metric] = statistics.median(run[metric] for run in runs)
+    seconds = sum(run["seconds"] for run in runs)
+    summary["tokens_per_second"] = sum(run["completion_tokens"] for run in runs) / seconds if seconds else 0.0
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--issues", type=int, default=6, help="legal issues per case (default: 6)")
+    parser.add_argument("--facts-paragraphs", type=int, default=40, help="paragraphs of case facts (default: 40)")
+    parser.add_argument("--runs", type=int, default=3, help="runs per document type (default: 3)")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token (default: 0.2)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="stub generation speed (default: 200)")
+    parser.add_argument("--completion-tokens", type=int, default=150, help="tokens per completion (default: 150)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503 (default: 0)")
+    parser.add_argument("--concurrency", type=int, help="override LEGAL_AI_MAX_CONCURRENCY")
+    parser.add_argument("--rate-per-minute", type=float, default=6000.0,
+                        help="per-model rate limit, high so the limiter does not dominate (default: 6000)")
+    parser.add_argument("--document-type", action="append", help="only benchmark this type (repeatable)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for injected errors (default: 0)")
+    parser.add_argument("--json", action="store_true", help="print one JSON line per document type")
+    args = parser.parse_args(argv)
+
+    server = StubOpenRouter(args.latency, args.tokens_per_second, args.completion_tokens, args.error_rate, args.seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # A fresh data directory keeps the AI response cache cold, so every run reaches the server
+        os.environ.update({
+            "LEGAL_DATA_DIR": data_dir,
+            "LEGAL_AI_BASE_URL": server.url,
+            "OPENROUTER_API_KEY": "benchmark",
+            "LEGAL_AI_RATE_PER_MINUTE": str(args.rate_per_minute),
+            "LEGAL_AI_BURST": str(max(5, args.issues)),
+        })
+        if args.concurrency:
+            os.environ["LEGAL_AI_MAX_CONCURRENCY"] = str(args.concurrency)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        # Importing the app outside `streamlit run` logs warnings that are irrelevant here
+        logging.disable(logging.WARNING)
+        import app
+        logging.disable(logging.NOTSET)
+
+        case_details = sample_case(app, args.issues, args.facts_paragraphs)
+        document_types = args.document_type or list(app.LegalBriefGenerator().document_templates)
+        results = []
+        for document_type in document_types:
+            runs = []
+            for run in range(args.runs):
+                os.environ["LEGAL_AI_CACHE_PATH"] = os.path.join(data_dir, f"ai_cache_{document_type}_{run}.sqlite3")
+                runs.append(run_document(app, app.LegalBriefGenerator(), server, document_type, case_details))
+            results.append(summarize(document_type, runs))
+    server.shutdown()
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+    else:
+        print(f"{'Document type':<24} {'total s':>8} {'ttft s':>7} {'sect p50':>8} {'sect p95':>8} "
+              f"{'conc':>9} {'requests':>8} {'errors':>6} {'failed':>6} {'tokens in/out':>15} {'tok/s':>7}")
+        for r in results:
+            print(f"{r['document_type']:<24} {r['seconds']:>8.2f} {r['first_token_p50']:>7.2f} {r['section_p50']:>8.2f} "
+                  f"{r['section_p95']:>8.2f} {r['mean_concurrency']:>4.1f}/{r['peak_concurrency']:<4.0f} "
+                  f"{r['requests']:>8.0f} {r['errors']:>6.0f} {r['failed_sections']:>6.0f} "
+                  f"{r['prompt_tokens']:>7.0f}/{r['completion_tokens']:<7.0f} {r['tokens_per_second']:>7.0f}")
+    return 1 if any(r["failed_sections"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())